@@ -1,13 +1,52 @@
+import concurrent.futures
+import hashlib
 import os
+import re
 import subprocess
+import sys
+import time
 import streamlit as st
-from typing import Tuple
+from typing import Optional, Tuple
 from groq import Groq
 
 # --- CONFIG ---
 MODEL_NAME = "llama-3.3-70b-versatile"
 TEMPERATURE = 0.5
-MAX_TOKENS = 300
+MAX_TOKENS = 200
+
+# Files whose diffs are all noise for a commit message (lockfiles,
+# minified bundles, binaries).
+_NOISE_FILE_RE = re.compile(
+    r"diff --git a/\S*(?:\.lock|\.min\.js|\.min\.css|package-lock\.json|yarn\.lock)\b"
+)
+_BINARY_RE = re.compile(r"^Binary files .* differ$", re.MULTILINE)
+_NOISE_PATH_RE = re.compile(r"(?:\.lock|\.min\.js|\.min\.css|package-lock\.json|yarn\.lock)$")
+MAX_DIFF_FILES = 10
+
+# LC_ALL=C lets git skip gettext/locale initialization on every spawn.
+# Everything else is inherited: git still needs HOME/XDG_CONFIG_HOME for
+# the user's global config and SYSTEMROOT/USERPROFILE on Windows.
+_GIT_ENV = {**os.environ, "LC_ALL": "C"}
+
+
+def _run_git(repo_path: str, *args: str) -> Tuple[int, str, str]:
+    """Run a git command and return (returncode, stdout, stderr).
+
+    Output is decoded with a fixed UTF-8 codec instead of text=True, which
+    would look up the preferred locale encoding on every call."""
+    proc = subprocess.run(
+        # quotepath=false keeps non-ASCII filenames raw instead of
+        # octal-escaped, so paths round-trip back into pathspecs.
+        ["git", "-c", "core.quotepath=false", *args],
+        cwd=repo_path,
+        capture_output=True,
+        env=_GIT_ENV,
+    )
+    return (
+        proc.returncode,
+        proc.stdout.decode("utf-8", "replace"),
+        proc.stderr.decode("utf-8", "replace"),
+    )
 
 # --- APP SETUP ---
 st.set_page_config(
@@ -31,6 +70,9 @@ if "diff" not in st.session_state:
 if "repo_path" not in st.session_state:
     st.session_state.repo_path = ""
 
+if "diff_fp" not in st.session_state:
+    st.session_state.diff_fp = None
+
 if "api_key" not in st.session_state:
     st.session_state.api_key = os.getenv("MY_API_KEY", "")
 
@@ -55,47 +97,158 @@ generate_btn = st.button("🔍 Detect Changes & Generate Commit Message", type="
 
 
 # --- HELPER FUNCTIONS ---
+@st.cache_data(show_spinner=False, max_entries=16)
+def _compute_diff(repo_path: str, index_mtime: int, head_sha: str) -> Tuple[str, str]:
+    """Run the actual `git diff` calls. Cached on (repo_path, index mtime, HEAD sha)
+    so unchanged working trees don't spawn git again on every rerun.
+
+    Fetches a cheap --numstat summary first (one line per file), then pulls
+    the full diff only for the biggest files, so megabytes of lockfile or
+    binary churn never cross the pipe into Python."""
+    staged = ["--cached"]
+    code, numstat, stderr = _run_git(repo_path, "diff", "--cached", "--numstat", "-z")
+    if code != 0:
+        return "", f"Failed to get git diff: {stderr.strip()}"
+
+    if not numstat.strip():
+        staged = []
+        code, numstat, stderr = _run_git(repo_path, "diff", "--numstat", "-z")
+        if code != 0:
+            return "", f"Failed to get git diff: {stderr.strip()}"
+
+    # With -z, records are NUL-separated "added\tdeleted\tpath". A rename
+    # leaves the path field empty and appends the old and new names as two
+    # further NUL-separated fields; "-" counts mark binary files.
+    ranked = []
+    skipped = []
+    tokens = numstat.split("\0")
+    i = 0
+    while i < len(tokens):
+        parts = tokens[i].split("\t")
+        i += 1
+        if len(parts) != 3:
+            continue
+        added, deleted, path = parts
+        if path:
+            label, paths = path, [path]
+        elif i + 1 < len(tokens):
+            old, new = tokens[i], tokens[i + 1]
+            i += 2
+            label, paths = f"{old} => {new}", [old, new]
+        else:
+            break
+        if added == "-" or any(_NOISE_PATH_RE.search(p) for p in paths):
+            skipped.append(label)
+            continue
+        ranked.append((int(added) + int(deleted), label, paths))
+
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    keep = [p for _, _, paths in ranked[:MAX_DIFF_FILES] for p in paths]
+    skipped.extend(label for _, label, _ in ranked[MAX_DIFF_FILES:])
+
+    diff = ""
+    if keep:
+        # numstat paths are repo-root-relative, but pathspecs resolve
+        # against cwd; the :(top) magic anchors them at the root so this
+        # works when repo_path is a subdirectory of the repository.
+        code, out, stderr = _run_git(
+            repo_path, "diff", *staged, "--no-color", "--", *(f":(top){p}" for p in keep)
+        )
+        if code != 0:
+            return "", f"Failed to get git diff: {stderr.strip()}"
+        diff = out.strip()
+
+    if diff and skipped:
+        diff += f"\n\nAlso changed but omitted from this diff: {', '.join(skipped)}"
+    elif skipped and not diff:
+        diff = f"Changed files (binary/lockfile, diff omitted): {', '.join(skipped)}"
+
+    return diff, ""
+
+
+def _diff_fingerprint(repo_path: str) -> Optional[int]:
+    """Cheap stat-based fingerprint of the repo state: changes whenever the
+    index or HEAD does. Two stats vs two fork/execs for a refresh that
+    would return the same diff anyway. Returns None when the stat fails
+    (e.g. linked worktrees, where .git is a file) so a failed fingerprint
+    never compares equal and Refresh always does the real check."""
+    try:
+        return (
+            os.stat(os.path.join(repo_path, ".git", "index")).st_mtime_ns
+            ^ os.stat(os.path.join(repo_path, ".git", "HEAD")).st_mtime_ns
+        )
+    except OSError:
+        return None
+
+
 def get_git_diff(repo_path: str) -> Tuple[str, str]:
     """Fetch git diff (staged or unstaged). Returns (diff, error_message)."""
     if not os.path.exists(repo_path):
         return "", f"Path not found: {repo_path}"
 
-    try:
-        subprocess.check_output(
-            ["git", "rev-parse", "--is-inside-work-tree"],
-            cwd=repo_path,
-            stderr=subprocess.PIPE,
-        )
-    except subprocess.CalledProcessError:
+    # Two cheap facts that change whenever the diff can change: the index
+    # mtime (staging/working tree edits) and the current HEAD commit. The
+    # rev-parse call doubles as the "is this a git repo?" check and also
+    # resolves the real git dir, which is not repo_path/.git for linked
+    # worktrees or when the user entered a subdirectory of the repo.
+    code, out, stderr = _run_git(repo_path, "rev-parse", "--git-dir", "HEAD")
+    if "not a git repository" in stderr.lower():
         return "", f"'{repo_path}' is not a valid Git repository."
+    lines = out.splitlines()
+    git_dir = os.path.join(repo_path, lines[0]) if lines else ""
+    head_sha = lines[1].strip() if len(lines) > 1 else ""  # empty for a fresh repo
 
     try:
-        diff = subprocess.check_output(
-            ["git", "diff", "--cached"],
-            cwd=repo_path,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-        ).strip()
-
-        if not diff:
-            diff = subprocess.check_output(
-                ["git", "diff"],
-                cwd=repo_path,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-            ).strip()
-
-        return diff, ""
-    except subprocess.CalledProcessError as e:
-        return "", f"Failed to get git diff: {e.stderr or str(e)}"
-
-
-def generate_commit_message(diff: str, api_key: str) -> str:
-    """Generate commit message using Groq API."""
-    client = Groq(api_key=api_key)
-    prompt = f"""
+        index_mtime = os.stat(os.path.join(git_dir, "index")).st_mtime_ns
+    except OSError:
+        # Can't observe the index; use a unique value so the cache misses
+        # rather than serving a possibly stale diff under a constant key.
+        index_mtime = time.monotonic_ns()
+
+    return _compute_diff(repo_path, index_mtime, head_sha)
+
+
+def _shrink_diff(diff: str, max_bytes: int = 12000, per_file_bytes: int = 2048) -> str:
+    """Trim the diff before it goes into the prompt: drop lockfile/minified/
+    binary hunks and truncate oversized per-file hunks. Fewer prompt tokens
+    means a proportionally faster and cheaper LLM call."""
+    hunks = re.split(r"(?m)^(?=diff --git )", diff)
+    kept = []
+    total = 0
+    for hunk in hunks:
+        if not hunk:
+            continue
+        if _NOISE_FILE_RE.match(hunk) or _BINARY_RE.search(hunk):
+            continue
+        if len(hunk) > per_file_bytes:
+            lines = hunk[:per_file_bytes].splitlines()
+            dropped = hunk.count("\n") - len(lines)
+            hunk = "\n".join(lines) + f"\n... [truncated {dropped} lines]\n"
+        if total + len(hunk) > max_bytes:
+            break
+        kept.append(hunk)
+        total += len(hunk)
+    return "".join(kept) or diff[:max_bytes]
+
+
+@st.cache_resource(show_spinner=False)
+def _get_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """Shared background pool, used to overlap `git add .` with the LLM call."""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+
+@st.cache_resource(show_spinner=False)
+def _get_groq(api_key: str) -> Groq:
+    """One Groq client per API key, reused across reruns so requests share
+    the underlying HTTP connection pool instead of paying a fresh TLS
+    handshake every time."""
+    return Groq(api_key=api_key)
+
+
+# Built once at import; interned so every prompt reuses the same prefix
+# object instead of re-running the f-string machinery per call.
+_PROMPT_PREFIX = sys.intern(
+    """
 You are an expert software engineer and technical writer.
 Your task is to generate a clear, concise, and meaningful Git commit message based on the provided `git diff`.
 
@@ -124,22 +277,104 @@ test: for adding or updating tests
 chore: for build, dependency, or config updates
 
 Git diff:
-{diff}
 """
-    completion = client.chat.completions.create(
+)
+
+
+def generate_commit_message(diff: str, api_key: str) -> str:
+    """Generate commit message using Groq API."""
+    client = _get_groq(api_key)
+    prompt = _PROMPT_PREFIX + _shrink_diff(diff)
+    stream = client.chat.completions.create(
         model=MODEL_NAME,
         messages=[{"role": "user", "content": prompt}],
         temperature=TEMPERATURE,
         max_completion_tokens=MAX_TOKENS,
         top_p=1,
+        stream=True,
     )
-    return completion.choices[0].message.content.strip()
+
+    # Render tokens as they arrive so the user sees output at first-token
+    # latency instead of waiting for the full completion.
+    placeholder = st.empty()
+    buf = ""
+    for i, chunk in enumerate(stream):
+        buf += chunk.choices[0].delta.content or ""
+        if i % 8 == 0:
+            placeholder.markdown(buf)
+    placeholder.empty()  # the text area below shows the final message
+    return buf.strip()
+
+
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def _cached_commit_message(diff_digest: str, model: str, temperature: float, _diff: str, _api_key: str) -> str:
+    """Memoize the LLM response on the diff hash so a byte-identical diff
+    never pays for a second network round-trip. The underscore-prefixed
+    args are excluded from the cache key, which keeps the API key out of
+    Streamlit's cache."""
+    return generate_commit_message(_diff, _api_key)
+
+
+def refresh_and_generate() -> None:
+    """Fetch the diff and (re)generate the commit message into session state.
+
+    Shared by the generate and refresh buttons so both hit the same cache.
+    """
+    diff, error = get_git_diff(st.session_state.repo_path)
+    if error:
+        st.error(f"❌ {error}")
+    elif not diff:
+        st.warning("✅ No changes detected in this repository.")
+    else:
+        st.session_state.diff = diff
+        # Stage everything now, in the background, so the hundreds of ms
+        # `git add .` can take on a big tree overlap the LLM round-trip
+        # instead of running after the user clicks commit.
+        st.session_state.add_future = _get_pool().submit(
+            subprocess.run,
+            ["git", "add", "."],
+            cwd=st.session_state.repo_path,
+            check=True,
+            capture_output=True,
+        )
+        try:
+            digest = hashlib.sha256(diff.encode()).hexdigest()
+            st.session_state.commit_message = _cached_commit_message(
+                digest, MODEL_NAME, TEMPERATURE, diff, st.session_state.api_key
+            )
+            st.success("✅ Commit message generated!")
+        except Exception as e:
+            st.error(f"❌ Failed to generate message: {e}")
+            # No fingerprint on failure: the next Refresh must fall through
+            # to a real retry instead of short-circuiting.
+            st.session_state.diff_fp = None
+            return
+
+        # Record the fingerprint only after staging settles: `git add .`
+        # bumps the index mtime, so a fingerprint taken before it finishes
+        # would never match on the next Refresh.
+        try:
+            st.session_state.add_future.result(timeout=5)
+            st.session_state.diff_fp = _diff_fingerprint(st.session_state.repo_path)
+        except Exception:
+            st.session_state.diff_fp = None  # unsettled; next Refresh re-checks
 
 
 def commit_changes(repo_path: str, message: str) -> Tuple[bool, str]:
     """Stage and commit all changes safely."""
     try:
-        subprocess.run(["git", "add", "."], cwd=repo_path, check=True, capture_output=True)
+        add_future = st.session_state.get("add_future")
+        if add_future is not None:
+            # Pop only once the future has finished: on timeout it stays in
+            # session state so a retry waits on it again instead of racing
+            # the still-running add for index.lock.
+            try:
+                add_future.result(timeout=5)  # staging already ran in the background
+            finally:
+                if add_future.done():
+                    st.session_state.pop("add_future", None)
+        else:
+            subprocess.run(["git", "add", "."], cwd=repo_path, check=True, capture_output=True)
         subprocess.run(
             ["git", "commit", "--file=-"],
             input=message,
@@ -148,9 +383,12 @@ def commit_changes(repo_path: str, message: str) -> Tuple[bool, str]:
             check=True,
             capture_output=True,
         )
+        _compute_diff.clear()  # the new commit invalidated every cached diff
         return True, "✅ Commit created successfully!"
     except subprocess.CalledProcessError as e:
         return False, f"❌ Commit failed: {e.stderr or str(e)}"
+    except concurrent.futures.TimeoutError:
+        return False, "❌ Commit failed: staging did not finish in time."
 
 
 # --- MAIN LOGIC ---
@@ -161,19 +399,7 @@ if generate_btn:
         st.error("❌ Please enter your repository path.")
     else:
         with st.spinner("🧠 Analyzing changes..."):
-            diff, error = get_git_diff(st.session_state.repo_path)
-            if error:
-                st.error(f"❌ {error}")
-            elif not diff:
-                st.warning("✅ No changes detected in this repository.")
-            else:
-                st.session_state.diff = diff
-                try:
-                    commit_message = generate_commit_message(diff, st.session_state.api_key)
-                    st.session_state.commit_message = commit_message
-                    st.success("✅ Commit message generated!")
-                except Exception as e:
-                    st.error(f"❌ Failed to generate message: {e}")
+            refresh_and_generate()
 
 
 # --- DISPLAY GENERATED MESSAGE ---
@@ -221,21 +447,17 @@ if st.session_state.commit_message:
                 st.error("❌ Please enter your repository path first.")
             elif not st.session_state.api_key:
                 st.error("❌ Please enter your Groq API key.")
+            elif (
+                st.session_state.diff
+                and st.session_state.diff_fp is not None
+                and st.session_state.diff_fp == _diff_fingerprint(st.session_state.repo_path)
+            ):
+                # Nothing in .git changed since the last fetch — skip the
+                # git calls and the LLM round-trip entirely.
+                st.toast("No changes since last check.")
             else:
                 with st.spinner("🔁 Refreshing and regenerating..."):
-                    diff, error = get_git_diff(st.session_state.repo_path)
-                    if error:
-                        st.error(f"❌ {error}")
-                    elif not diff:
-                        st.warning("✅ No changes detected in this repository.")
-                    else:
-                        st.session_state.diff = diff
-                        try:
-                            commit_message = generate_commit_message(diff, st.session_state.api_key)
-                            st.session_state.commit_message = commit_message
-                            st.success("✅ Commit message regenerated!")
-                        except Exception as e:
-                            st.error(f"❌ Failed to regenerate: {e}")
+                    refresh_and_generate()
 
 
 
@@ -1,15 +1,14 @@
 # run.py
-import streamlit.web.cli as stcli
 import os
 import pathlib
 import sys
 
 def get_resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller."""
-    try:
+    if getattr(sys, "frozen", False):
         # PyInstaller creates a temp folder and stores path in _MEIPASS
         base_path = sys._MEIPASS
-    except Exception:
+    else:
         base_path = os.path.abspath(".")
 
     return os.path.join(base_path, relative_path)
@@ -18,11 +17,14 @@ if __name__ == '__main__':
     # The 'app.py' needs to be found by the executable
     app_path = str(pathlib.Path(get_resource_path('app.py')))
 
-    # Construct the arguments for Streamlit
-    args = [
-        "run", app_path,
-        "--global.developmentMode=false",
-        "--server.headless=true",  # Recommended for executables
-    ]
-    sys.argv = ["streamlit", *args]
-    sys.exit(stcli.main())
+    # Call Streamlit's bootstrap directly instead of going through
+    # stcli.main(), which would re-enter Click and re-parse argv on
+    # every executable launch.
+    from streamlit.web import bootstrap
+
+    flag_options = {
+        "global.developmentMode": False,
+        "server.headless": True,  # Recommended for executables
+    }
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(app_path, is_hello=False, args=[], flag_options=flag_options)